@@ -0,0 +1,160 @@
+"""
+pokespeare.accesslog.py
+~~~~~~~~~~~~~~~~~~~~~~~
+
+Buffered, non-blocking access logger. Each request is serialized into a JSON
+line and appended to an in-memory buffer, a background thread takes care of
+flushing the buffer to the output stream, so that the request path never
+waits on a write to stdout.
+"""
+
+import os
+import sys
+import json
+import time
+import atexit
+import random
+import threading
+from collections import deque
+from typing import Any, Dict, IO, Optional
+
+
+class AccessLogger:
+    """Structured JSON-lines access logger flushed by a background thread.
+
+    :type stream: IO
+    :param stream: The output stream to write records to, default to stdout
+
+    :type sample_rate: float
+    :param sample_rate: Fraction between 0.0 and 1.0 of successful requests to
+                        log, errors and slow requests are always logged
+
+    :type slow_threshold: float
+    :param slow_threshold: Milliseconds after which a request is considered
+                           slow and always logged
+
+    :type flush_interval: float
+    :param flush_interval: Seconds between each flush of the buffer
+
+    :type buffer_size: int
+    :param buffer_size: Max number of records kept in memory between two
+                        flushes, oldest records are dropped when full
+    """
+
+    def __init__(
+        self,
+        stream: Optional[IO] = None,
+        *,
+        sample_rate: float = 1.0,
+        slow_threshold: float = 1000.0,
+        flush_interval: float = 1.0,
+        buffer_size: int = 10000
+    ):
+        self.stream = stream or sys.stdout
+        self.sample_rate = sample_rate
+        self.slow_threshold = slow_threshold
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        # deque appends and pops are thread-safe, no need for explicit locks
+        # on the hot path
+        self._buffer = deque(maxlen=buffer_size)
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        atexit.register(self.close)
+
+    def should_log(self, status: int, duration: float) -> bool:
+        """Errors and slow requests are always logged, successful ones are
+        sampled according to `sample_rate`"""
+        if status >= 400 or duration >= self.slow_threshold:
+            return True
+        return random.random() < self.sample_rate
+
+    def log(self, record: Dict[str, Any]) -> bool:
+        """Enqueue a record to be written by the flusher thread, return True
+        if the record has been accepted, False if it was sampled out"""
+        if not self.should_log(record["status"], record["duration_ms"]):
+            return False
+        self._ensure_started()
+        if len(self._buffer) == self._buffer.maxlen:
+            self.dropped += 1
+        self._buffer.append(record)
+        return True
+
+    def flush(self) -> None:
+        """Write out every buffered record in a single write call"""
+        lines = []
+        try:
+            while True:
+                lines.append(json.dumps(self._buffer.popleft()))
+        except IndexError:
+            pass
+        if not lines:
+            return
+        try:
+            self.stream.write("\n".join(lines) + "\n")
+            self.stream.flush()
+        except (OSError, ValueError):
+            # Closed or broken stream, nothing sensible to do from a
+            # background thread
+            pass
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Stop the flusher thread of the current process, waiting at most
+        `timeout` seconds, and write out any record left in the buffer"""
+        self._stop.set()
+        if self._thread and self._pid == os.getpid():
+            self._thread.join(timeout)
+        self.flush()
+
+    def _ensure_started(self) -> None:
+        # Gunicorn forks workers after the app module is imported, threads do
+        # not survive a fork so the flusher is started lazily on each process
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._start_lock:
+            if self._pid == pid:
+                return
+            # A fresh event, one inherited from the parent may be already set
+            self._stop = threading.Event()
+            self._thread = threading.Thread(
+                target=self._run, name="pokespeare-accesslog", daemon=True
+            )
+            self._thread.start()
+            self._pid = pid
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+
+def make_record(
+    method: str,
+    path: str,
+    status: int,
+    started: float,
+    upstream: list,
+    cache: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Build an access log record, `upstream` is a list of dict with timings
+    and cache informations for each call to the external services, `cache`
+    is the name of the application cache which served the request, if any"""
+    duration = (time.perf_counter() - started) * 1000
+    if status >= 400:
+        outcome = "error"
+    elif cache or (upstream and all(call["cache"] for call in upstream)):
+        outcome = "hit"
+    else:
+        outcome = "miss"
+    return {
+        "ts": time.time(),
+        "method": method,
+        "path": path,
+        "status": status,
+        "duration_ms": round(duration, 3),
+        "outcome": outcome,
+        "cache": cache,
+        "upstream": upstream,
+    }
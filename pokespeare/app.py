@@ -7,10 +7,21 @@ APIs definition and server related functions
 
 import os
 import sys
-from typing import Tuple
-from flask import Flask, abort, jsonify
+import time
+from typing import Any, Callable, Optional, Tuple
+from flask import Flask, abort, jsonify, g, request
 from gunicorn.app.base import BaseApplication
-from .models import PokemonSchema, ShakespeareTextSchema
+from .accesslog import AccessLogger, make_record
+from .cache import (
+    CompactCache,
+    MemoryStore,
+    RedisStore,
+    SharedMemoryStore,
+    SharedMemoryTable,
+    SQLiteStore,
+)
+from .profiling import PROFILE_HEADER, RequestProfiler
+from .models import Pokemon, PokemonSchema, ShakespeareTextSchema
 from .exceptions import MalformedJSONResponseError, HTTPError, UnexpectedError
 from .http import HTTPClient, RequestsHTTPClient
 
@@ -27,6 +38,9 @@ if not os.getenv("APP_CONFIG"):
 
 flask_app.config.from_object(os.getenv("APP_CONFIG"))
 _http = None
+_access_logger = None
+_profiler = None
+_description_cache = None
 
 
 def get_http_client(
@@ -52,6 +66,149 @@ def get_http_client(
     return _http
 
 
+def configured_http_client() -> HTTPClient:
+    """Return the HTTP client configured according to the app config"""
+    options = {}
+    if flask_app.config.get("CACHE_BACKEND") == "shm":
+        options = {
+            "slots": flask_app.config.get("SHM_CACHE_SLOTS"),
+            "slot_size": flask_app.config.get("SHM_CACHE_SLOT_SIZE"),
+        }
+    # On compact mode upstream responses are not cached at all, only the
+    # projected fields through `get_description_cache`
+    cache_name = flask_app.config.get("CACHE_NAME")
+    if flask_app.config.get("CACHE_MODE") == "compact":
+        cache_name = ""
+    return get_http_client(
+        cache_name,
+        backend=flask_app.config.get("CACHE_BACKEND"),
+        expire_after=flask_app.config.get("CACHE_EXPIRATION"),
+        allowable_methods=("GET", "POST"),
+        **options
+    )
+
+
+def get_description_cache() -> Optional[CompactCache]:
+    """Lazily build the compact description cache on the configured backend,
+    return `None` if the cache mode is not `compact`"""
+    global _description_cache
+    if flask_app.config.get("CACHE_MODE") != "compact":
+        return None
+    if not _description_cache:
+        backend = flask_app.config.get("CACHE_BACKEND")
+        expire_after = flask_app.config.get("CACHE_EXPIRATION")
+        if backend == "shm":
+            # Compact entries are a few hundreds bytes, slots sized for whole
+            # HTTP responses would be almost entirely wasted
+            store = SharedMemoryStore(
+                SharedMemoryTable(
+                    flask_app.config.get("COMPACT_CACHE_SLOTS"),
+                    flask_app.config.get("COMPACT_CACHE_SLOT_SIZE"),
+                    ttl=expire_after,
+                )
+            )
+        elif backend == "sqlite":
+            store = SQLiteStore(flask_app.config.get("CACHE_NAME") + ".sqlite")
+        elif backend == "redis":
+            store = RedisStore(
+                flask_app.config.get("CACHE_NAME"), ttl=expire_after
+            )
+        else:
+            store = MemoryStore()
+        _description_cache = CompactCache(
+            store,
+            expire_after=expire_after,
+            compress=flask_app.config.get("CACHE_COMPRESS"),
+        )
+    return _description_cache
+
+
+def get_access_logger() -> AccessLogger:
+    """Lazily build the access logger based on the current configuration"""
+    global _access_logger
+    if not _access_logger:
+        _access_logger = AccessLogger(
+            sample_rate=flask_app.config.get("ACCESS_LOG_SAMPLE_RATE"),
+            slow_threshold=flask_app.config.get("ACCESS_LOG_SLOW_MS"),
+            flush_interval=flask_app.config.get("ACCESS_LOG_FLUSH_INTERVAL"),
+            buffer_size=flask_app.config.get("ACCESS_LOG_BUFFER_SIZE"),
+        )
+    return _access_logger
+
+
+def get_request_profiler() -> RequestProfiler:
+    """Lazily build the request profiler based on the current configuration"""
+    global _profiler
+    if not _profiler:
+        _profiler = RequestProfiler(
+            flask_app.config.get("PROFILE_DIR"),
+            token=flask_app.config.get("PROFILE_TOKEN"),
+            sample_every=flask_app.config.get("PROFILE_SAMPLE_EVERY"),
+        )
+    return _profiler
+
+
+def upstream_call(
+    service: str, method: Callable, url: str, **kwargs: Any
+) -> Any:
+    """Perform a call to an external service through `method`, tracking
+    timing, status code and cache usage for the access log"""
+    call = {"service": service, "status": None, "cache": None}
+    started = time.perf_counter()
+    try:
+        response = method(url, **kwargs)
+        call["status"] = response.status_code
+        if getattr(response, "from_cache", False):
+            call["cache"] = flask_app.config.get("CACHE_BACKEND")
+        return response
+    finally:
+        call["ms"] = round((time.perf_counter() - started) * 1000, 3)
+        g.upstream.append(call)
+
+
+@flask_app.before_request
+def start_request_timer():
+    g.started = time.perf_counter()
+    g.upstream = []
+    g.cache = None
+
+
+@flask_app.before_request
+def start_profiler():
+    # Single config lookup when profiling is off
+    if flask_app.config.get("PROFILE"):
+        profiler = get_request_profiler()
+        if profiler.should_profile(request.headers.get(PROFILE_HEADER)):
+            g.profile = profiler.start()
+
+
+@flask_app.teardown_request
+def stop_profiler(_):
+    profile = g.pop("profile", None)
+    if profile:
+        # A diagnostic hook must never break the request it profiles
+        try:
+            get_request_profiler().stop(profile, request.endpoint)
+        except OSError as err:
+            flask_app.logger.error("Unable to dump request profile: %s", err)
+
+
+@flask_app.after_request
+def log_request(response):
+    if flask_app.config.get("ACCESS_LOG"):
+        get_access_logger().log(
+            make_record(
+                request.method,
+                request.path,
+                response.status_code,
+                g.started,
+                g.upstream,
+                g.cache,
+            )
+        )
+    return response
+
+
 @flask_app.errorhandler(404)
 def resource_not_found(err):
     return jsonify(error=str(err)), 404
@@ -76,35 +233,46 @@ def get_pokemon_description(pokemon_name):
     module, for a bigger REST service it would probably a better idea to move
     it into its own module for resources only.
     """
+    schema = PokemonSchema()
+    sh_schema = ShakespeareTextSchema()
+    # On compact cache mode a hit skips the upstream calls altogether
+    cache = get_description_cache()
+    if cache:
+        cached = cache.get(pokemon_name)
+        if cached:
+            g.cache = "compact"
+            return jsonify(
+                schema.dump(Pokemon(cached["name"], cached["translated"]))
+            )
     # Get an HTTPClient instance, `get_http_client` is intended as a "poor"
     # factory to get external dependency, a requests wrapper in this case
     # to avoid strong coupling
-    http = get_http_client(
-        flask_app.config.get("CACHE_NAME"),
-        backend=flask_app.config.get("CACHE_BACKEND"),
-        expire_after=flask_app.config.get("CACHE_EXPIRATION"),
-        allowable_methods=("GET", "POST"),
-    )
+    http = configured_http_client()
     pokemon_url = flask_app.config.get("POKEMON_API_URL")
     translator_url = flask_app.config.get("TRANSLATOR_API_URL")
     # Optional API key
     translator_api = flask_app.config.get("TRANSLATOR_API_KEY")
-    schema = PokemonSchema()
-    sh_schema = ShakespeareTextSchema()
     try:
         # Call to pokeapi.co/v2
-        response = http.get(os.path.join(pokemon_url, pokemon_name))
+        response = upstream_call(
+            "pokeapi", http.get, os.path.join(pokemon_url, pokemon_name)
+        )
         pokemon = schema.load(response.json())
         # Call to funtranslations.com
         if translator_api:
-            response = http.post(
+            response = upstream_call(
+                "funtranslations",
+                http.post,
                 translator_url,
                 json={"text": pokemon.description},
                 headers={"X-Funtranslations-Api-Secret": translator_api},
             )
         else:
-            response = http.post(
-                translator_url, json={"text": pokemon.description},
+            response = upstream_call(
+                "funtranslations",
+                http.post,
+                translator_url,
+                json={"text": pokemon.description},
             )
         # Avoid raise_for_status() call to have better control over the
         # return codes in case of 429 (too many requests, cap reached)
@@ -118,6 +286,13 @@ def get_pokemon_description(pokemon_name):
         abort(404, description=err)
     except UnexpectedError:
         abort(404)
+    if cache:
+        cache.set(
+            pokemon_name,
+            pokemon.name,
+            pokemon.description,
+            shakespeare_text.translated,
+        )
     pokemon.description = shakespeare_text.translated
     return jsonify(schema.dump(pokemon))
 
@@ -155,7 +330,14 @@ def serve():
             "bind": "%s:%s"
             % (flask_app.config["HOST"], str(flask_app.config["PORT"])),
             "workers": flask_app.config["WORKERS"],
-            "accesslog": "-",
+            # The buffered access logger replaces gunicorn synchronous one,
+            # a `None` value leaves the gunicorn access log disabled
+            "accesslog": None if flask_app.config["ACCESS_LOG"] else "-",
             "errorlog": "-",
         }
+        if flask_app.config["CACHE_BACKEND"] == "shm":
+            # The shared memory segment has to be created by the master
+            # process, before forking, to be inherited by all the workers
+            configured_http_client()
+            get_description_cache()
         WSGIApplication(flask_app, options).run()
@@ -0,0 +1,499 @@
+"""
+pokespeare.cache.py
+~~~~~~~~~~~~~~~~~~~
+
+Shared-memory cache backend for requests-cache. The storage is a fixed-size
+set-associative hash table living in an anonymous shared mmap: created by the
+gunicorn master process before forking, it's inherited by every worker which
+all read and write the same warm cache without any external service.
+
+Readers are lock-free and rely on a per-slot seqlock, writers serialize on a
+small pool of process-shared locks, each one guarding a stripe of buckets.
+
+Also contains the compact description cache, storing only the fields actually
+used by the API instead of the whole upstream responses.
+"""
+
+import os
+import mmap
+import json
+import time
+import zlib
+import struct
+import pickle
+import sqlite3
+import hashlib
+import multiprocessing
+from contextlib import contextmanager
+from collections.abc import MutableMapping
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+from requests_cache.backends.base import BaseCache
+
+# Slot header: seq, state, key hash, stored at, expires at, key len, value len
+_HEADER = struct.Struct("<IBxxxQddII")
+_SEQ = struct.Struct("<I")
+_EMPTY = 0
+_USED = 1
+
+
+class SharedMemoryTable:
+    """Fixed-size hash table of bytes keys and values over shared memory.
+
+    Each key hashes to a bucket of `ways` consecutive slots, a new entry takes
+    the first free or expired slot of its bucket, evicting the oldest one if
+    none is available. Entries bigger than a slot are not stored at all.
+
+    Writers wait at most `LOCK_TIMEOUT` seconds for their stripe lock: a
+    worker killed while holding it never releases it, from then on writes to
+    that stripe are skipped rather than hanging the request.
+
+    :type slots: int
+    :param slots: Total number of slots, rounded down to a multiple of `ways`
+
+    :type slot_size: int
+    :param slot_size: Size in bytes of each slot, header included
+
+    :type ways: int
+    :param ways: Number of slots per bucket
+
+    :type stripes: int
+    :param stripes: Number of process-shared locks for writers
+
+    :type ttl: int
+    :param ttl: Seconds after which an entry is considered expired, `None`
+                to never expire entries
+    """
+
+    # Max attempts of a lock-free read before giving up and report a miss
+    MAX_READ_RETRIES = 64
+
+    # Max seconds a writer waits for its stripe lock before skipping the write
+    LOCK_TIMEOUT = 1.0
+
+    def __init__(
+        self,
+        slots: int = 512,
+        slot_size: int = 131072,
+        *,
+        ways: int = 8,
+        stripes: int = 64,
+        ttl: Optional[int] = None
+    ):
+        if slot_size <= _HEADER.size:
+            raise ValueError(
+                "slot_size must be greater than %d bytes" % _HEADER.size
+            )
+        self.ways = ways
+        self.buckets = max(1, slots // ways)
+        self.slots = self.buckets * ways
+        # Keep slots 8-bytes aligned
+        self.slot_size = slot_size - slot_size % 8
+        self.capacity = self.slot_size - _HEADER.size
+        self.ttl = ttl
+        # Anonymous mmap are MAP_SHARED by default, forked children share the
+        # very same pages
+        self._mem = mmap.mmap(-1, self.slots * self.slot_size)
+        self._locks = [
+            multiprocessing.Lock() for _ in range(min(stripes, self.buckets))
+        ]
+
+    @staticmethod
+    def _hash(key: bytes) -> int:
+        # Builtin hash() is randomized per interpreter, use a stable one
+        return int.from_bytes(
+            hashlib.blake2b(key, digest_size=8).digest(), "little"
+        )
+
+    def _bucket(self, key_hash: int) -> range:
+        start = (key_hash % self.buckets) * self.ways
+        return range(start, start + self.ways)
+
+    @contextmanager
+    def _locked(self, bucket: int) -> Iterator[bool]:
+        """Acquire the stripe lock of `bucket`, yield False on timeout"""
+        lock = self._locks[bucket % len(self._locks)]
+        acquired = lock.acquire(timeout=self.LOCK_TIMEOUT)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                lock.release()
+
+    def _read(
+        self, index: int, key_hash: Optional[int] = None, with_value=True
+    ) -> Optional[Tuple[bytes, bytes, float]]:
+        """Lock-free read of a slot, return a (key, value, expires) tuple if
+        the slot is in use and, if given, matches `key_hash`"""
+        mem = self._mem
+        offset = index * self.slot_size
+        start = offset + _HEADER.size
+        for _ in range(self.MAX_READ_RETRIES):
+            seq = _SEQ.unpack_from(mem, offset)[0]
+            if seq & 1:
+                continue
+            _, state, slot_hash, _, expires, klen, vlen = _HEADER.unpack_from(
+                mem, offset
+            )
+            # Lengths over the capacity can only come from a torn header,
+            # don't slice up to the end of the mmap just to throw it away
+            if klen + vlen > self.capacity:
+                continue
+            entry = None
+            if state == _USED and key_hash in (None, slot_hash):
+                key = mem[start:start + klen]
+                value = (
+                    mem[start + klen:start + klen + vlen]
+                    if with_value
+                    else b""
+                )
+                entry = (key, value, expires)
+            if _SEQ.unpack_from(mem, offset)[0] == seq:
+                return entry
+        return None
+
+    def _write(
+        self,
+        index: int,
+        key_hash: int,
+        key: bytes,
+        value: bytes,
+        stored: float,
+        expires: float,
+        state: int = _USED,
+    ) -> None:
+        """Write a slot, must be called holding the bucket lock"""
+        mem = self._mem
+        offset = index * self.slot_size
+        start = offset + _HEADER.size
+        # Odd sequence number means write in progress, readers will retry.
+        # Force the parity instead of incrementing, so that a slot left odd
+        # by a writer killed mid-way recovers on the next write
+        seq = _SEQ.unpack_from(mem, offset)[0] | 1
+        _HEADER.pack_into(
+            mem,
+            offset,
+            seq,
+            state,
+            key_hash,
+            stored,
+            expires,
+            len(key),
+            len(value),
+        )
+        mem[start:start + len(key) + len(value)] = key + value
+        _SEQ.pack_into(mem, offset, (seq + 1) & 0xFFFFFFFF)
+
+    def get(self, key: bytes) -> Optional[bytes]:
+        """Return the value stored for `key` or `None` if missing or expired"""
+        key_hash = self._hash(key)
+        now = time.time()
+        for index in self._bucket(key_hash):
+            entry = self._read(index, key_hash)
+            if entry and entry[0] == key:
+                return entry[1] if entry[2] > now else None
+        return None
+
+    def set(self, key: bytes, value: bytes) -> bool:
+        """Store `value` for `key`, return False if it doesn't fit a slot or
+        the stripe lock couldn't be acquired"""
+        if len(key) + len(value) > self.capacity:
+            return False
+        key_hash = self._hash(key)
+        now = time.time()
+        expires = now + self.ttl if self.ttl else float("inf")
+        with self._locked(key_hash % self.buckets) as acquired:
+            if not acquired:
+                return False
+            target, free, oldest, oldest_stored = None, None, None, None
+            for index in self._bucket(key_hash):
+                offset = index * self.slot_size
+                _, state, slot_hash, stored, slot_expires, klen, _ = (
+                    _HEADER.unpack_from(self._mem, offset)
+                )
+                if state != _USED or slot_expires <= now:
+                    if free is None:
+                        free = index
+                    continue
+                start = offset + _HEADER.size
+                if (
+                    slot_hash == key_hash
+                    and self._mem[start:start + klen] == key
+                ):
+                    target = index
+                    break
+                if oldest is None or stored < oldest_stored:
+                    oldest, oldest_stored = index, stored
+            if target is None:
+                target = free if free is not None else oldest
+            self._write(target, key_hash, key, value, now, expires)
+        return True
+
+    def delete(self, key: bytes) -> bool:
+        """Remove `key` from the table, return False if it wasn't there or
+        the stripe lock couldn't be acquired"""
+        key_hash = self._hash(key)
+        with self._locked(key_hash % self.buckets) as acquired:
+            if not acquired:
+                return False
+            for index in self._bucket(key_hash):
+                entry = self._read(index, key_hash, with_value=False)
+                if entry and entry[0] == key:
+                    self._write(index, 0, b"", b"", 0.0, 0.0, _EMPTY)
+                    return True
+        return False
+
+    def keys(self) -> Iterator[bytes]:
+        """Iterate over every key not yet expired"""
+        now = time.time()
+        for index in range(self.slots):
+            entry = self._read(index, with_value=False)
+            if entry and entry[2] > now:
+                yield entry[0]
+
+    def clear(self) -> None:
+        """Remove every entry, buckets whose lock can't be acquired are left
+        untouched"""
+        for bucket in range(self.buckets):
+            with self._locked(bucket) as acquired:
+                if not acquired:
+                    continue
+                for index in range(bucket * self.ways, (bucket + 1) * self.ways):
+                    self._write(index, 0, b"", b"", 0.0, 0.0, _EMPTY)
+
+
+class SharedMemoryDict(MutableMapping):
+    """Dict-like view over a namespace of a `SharedMemoryTable`, values are
+    pickled in and out of the shared memory"""
+
+    # Values are already pickled here, nothing for requests-cache to add
+    serializer = None
+
+    def __init__(self, table: SharedMemoryTable, namespace: str):
+        self.table = table
+        self.prefix = (namespace + ":").encode()
+
+    def _key(self, key: str) -> bytes:
+        return self.prefix + key.encode()
+
+    def __getitem__(self, key: str) -> Any:
+        value = self.table.get(self._key(key))
+        if value is None:
+            raise KeyError(key)
+        item = pickle.loads(value)
+        try:
+            item.cache_key = key
+        except AttributeError:
+            pass
+        return item
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self.table.set(
+            self._key(key), pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        )
+
+    def __delitem__(self, key: str) -> None:
+        if not self.table.delete(self._key(key)):
+            raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        for key in self.table.keys():
+            if key.startswith(self.prefix):
+                yield key[len(self.prefix):].decode()
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def bulk_delete(self, keys: Iterable[str]) -> None:
+        for key in keys:
+            self.table.delete(self._key(key))
+
+    def clear(self) -> None:
+        self.bulk_delete(list(self))
+
+    def close(self) -> None:
+        pass
+
+
+class SharedMemoryCache(BaseCache):
+    """requests-cache backend storing responses in a `SharedMemoryTable`.
+
+    :type cache_name: str
+    :param cache_name: The name of the cache, unused by this backend
+
+    :type slots: int
+    :param slots: Total number of slots of the shared table
+
+    :type slot_size: int
+    :param slot_size: Size in bytes of each slot, responses bigger than that
+                      are not cached
+
+    :type expire_after: int
+    :param expire_after: Seconds after which entries free their slot
+    """
+
+    def __init__(
+        self,
+        cache_name: str = "",
+        *,
+        slots: int = 512,
+        slot_size: int = 131072,
+        expire_after: Optional[int] = None,
+        **kwargs
+    ):
+        super().__init__(cache_name, **kwargs)
+        self.table = SharedMemoryTable(slots, slot_size, ttl=expire_after)
+        self.responses = SharedMemoryDict(self.table, "responses")
+        # `keys_map` on requests-cache < 0.6, `redirects` on newer versions
+        self.redirects = self.keys_map = SharedMemoryDict(
+            self.table, "redirects"
+        )
+
+
+class MemoryStore:
+    """Per-process dict based store for the compact cache"""
+
+    def __init__(self):
+        self._data = {}
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._data.get(key)
+
+    def set(self, key: str, value: bytes) -> None:
+        self._data[key] = value
+
+
+class SharedMemoryStore:
+    """`SharedMemoryTable` based store for the compact cache"""
+
+    def __init__(self, table: SharedMemoryTable):
+        self.table = table
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.table.get(key.encode())
+
+    def set(self, key: str, value: bytes) -> None:
+        self.table.set(key.encode(), value)
+
+
+class SQLiteStore:
+    """SQLite based store for the compact cache, a connection is lazily opened
+    on each process as they can't be shared across forks"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = None
+        self._pid = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._pid != os.getpid():
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS compact "
+                "(key TEXT PRIMARY KEY, value BLOB)"
+            )
+            self._pid = os.getpid()
+        return self._conn
+
+    def get(self, key: str) -> Optional[bytes]:
+        row = self.conn.execute(
+            "SELECT value FROM compact WHERE key = ?", (key,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: bytes) -> None:
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO compact (key, value) VALUES (?, ?)",
+                (key, value),
+            )
+
+
+class RedisStore:
+    """Redis based store for the compact cache, requires the `redis` package"""
+
+    def __init__(self, namespace: str, connection: Any = None, ttl: int = 0):
+        if connection is None:
+            from redis import StrictRedis
+
+            connection = StrictRedis()
+        self.namespace = namespace
+        self.connection = connection
+        self.ttl = ttl
+
+    def _key(self, key: str) -> str:
+        # requests-cache redis backend owns `<namespace>:responses` and
+        # `<namespace>:redirects`, keep compact entries on a separate prefix
+        return "%s:compact:%s" % (self.namespace, key)
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.connection.get(self._key(key))
+
+    def set(self, key: str, value: bytes) -> None:
+        self.connection.set(self._key(key), value, ex=self.ttl or None)
+
+
+class CompactCache:
+    """Cache of the projected pokemon descriptions. Each entry only holds the
+    name, the English flavor text, its translation and the time it was cached,
+    encoded as a compact JSON array, optionally zlib compressed.
+
+    :type store: object
+    :param store: Any object exposing `get(key)` and `set(key, value)` of
+                  bytes values, e.g. `MemoryStore` or `SQLiteStore`
+
+    :type expire_after: int
+    :param expire_after: Seconds after which an entry is considered expired
+
+    :type compress: bool
+    :param compress: Compress each entry with zlib
+    """
+
+    # First byte of each entry, tells how to decode the rest of it
+    JSON = b"j"
+    ZLIB = b"z"
+
+    def __init__(
+        self, store: Any, *, expire_after: int = 3600, compress: bool = False
+    ):
+        self.store = store
+        self.expire_after = expire_after
+        self.compress = compress
+
+    def encode(self, name: str, text: str, translated: str) -> bytes:
+        payload = json.dumps(
+            [name, text, translated, int(time.time())],
+            separators=(",", ":"),
+            ensure_ascii=False,
+        ).encode()
+        if self.compress:
+            return self.ZLIB + zlib.compress(payload)
+        return self.JSON + payload
+
+    @classmethod
+    def decode(cls, value: bytes) -> Dict[str, Any]:
+        payload = value[1:]
+        if value[:1] == cls.ZLIB:
+            payload = zlib.decompress(payload)
+        name, text, translated, cached_at = json.loads(payload)
+        return {
+            "name": name,
+            "text": text,
+            "translated": translated,
+            "cached_at": cached_at,
+        }
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the cached entry for `key`, `None` if missing or expired"""
+        value = self.store.get(key)
+        if value is None:
+            return None
+        entry = self.decode(value)
+        if self.expire_after and (
+            entry["cached_at"] + self.expire_after <= time.time()
+        ):
+            return None
+        return entry
+
+    def set(self, key: str, name: str, text: str, translated: str) -> None:
+        self.store.set(key, self.encode(name, text, translated))
@@ -18,6 +18,12 @@ class Config:
     CACHE_NAME = os.getenv("CACHE_NAME", "pokespeare_cache")
     CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
     CACHE_EXPIRATION = int(os.getenv("CACHE_EXPIRATION", "3600"))
+    CACHE_MODE = os.getenv("CACHE_MODE", "http")
+    CACHE_COMPRESS = os.getenv("CACHE_COMPRESS", "false").lower() == "true"
+    SHM_CACHE_SLOTS = int(os.getenv("SHM_CACHE_SLOTS", "512"))
+    SHM_CACHE_SLOT_SIZE = int(os.getenv("SHM_CACHE_SLOT_SIZE", "131072"))
+    COMPACT_CACHE_SLOTS = int(os.getenv("COMPACT_CACHE_SLOTS", "4096"))
+    COMPACT_CACHE_SLOT_SIZE = int(os.getenv("COMPACT_CACHE_SLOT_SIZE", "1024"))
     POKEMON_API_URL = os.getenv(
         "POKEMON_API_URL", "https://pokeapi.co/api/v2/pokemon-species/"
     )
@@ -26,6 +32,17 @@ class Config:
         "https://api.funtranslations.com/translate/shakespeare.json",
     )
     TRANSLATOR_API_KEY = os.getenv("TRANSLATOR_API_KEY")
+    ACCESS_LOG = os.getenv("ACCESS_LOG", "false").lower() == "true"
+    ACCESS_LOG_SAMPLE_RATE = float(os.getenv("ACCESS_LOG_SAMPLE_RATE", "1.0"))
+    ACCESS_LOG_SLOW_MS = float(os.getenv("ACCESS_LOG_SLOW_MS", "1000"))
+    ACCESS_LOG_FLUSH_INTERVAL = float(
+        os.getenv("ACCESS_LOG_FLUSH_INTERVAL", "1.0")
+    )
+    ACCESS_LOG_BUFFER_SIZE = int(os.getenv("ACCESS_LOG_BUFFER_SIZE", "10000"))
+    PROFILE = os.getenv("PROFILE", "false").lower() == "true"
+    PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+    PROFILE_SAMPLE_EVERY = int(os.getenv("PROFILE_SAMPLE_EVERY", "0"))
+    PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
     WSGI_SERVER = "flask"
 
 
@@ -35,6 +52,7 @@ class DevelopmentConfig(Config):
 
 class ProductionConfig(Config):
     CACHE_BACKEND = os.getenv("CACHE_BACKEND", "sqlite")
+    ACCESS_LOG = os.getenv("ACCESS_LOG", "true").lower() == "true"
     WSGI_SERVER = "gunicorn"
     WORKERS = int(os.getenv("WORKERS", str(number_of_workers())))
     HOST = os.getenv("HOST", "localhost")
@@ -10,6 +10,7 @@ import abc
 import requests
 from typing import Dict, Tuple, Any
 from .exceptions import HTTPError, UnexpectedError
+from .cache import SharedMemoryCache
 import requests_cache
 
 
@@ -25,8 +26,9 @@ class HTTPClient(abc.ABC):
 
     :type backend: str
     :param backend: The backend to use, can be either `memory` to use a simple
-                    python dict, `sqlite` to use a sqlite DB on the filesystem
-                    or `redis` for a redis cache
+                    python dict, `sqlite` to use a sqlite DB on the filesystem,
+                    `redis` for a redis cache or `shm` for a shared memory
+                    table shared by all the processes forked after its creation
 
     :type expire_after: int
     :param expire_after: Define after how many seconds each key in the cache
@@ -36,7 +38,8 @@ class HTTPClient(abc.ABC):
     :param allowable_methods: A tuple of strings defining for which HTTP
                               methods to apply caching
 
-    Also supports `connection` in case of a redis connection on kwargs,
+    Also supports `connection` in case of a redis connection on kwargs, or
+    `slots` and `slot_size` to size the `shm` backend,
     for more info `https://requests-cache.readthedocs.io/en/latest/api.html`
     """
 
@@ -85,9 +88,17 @@ class RequestsHTTPClient(HTTPClient):
     """
 
     def enable_cache(self, **kwargs: Dict[str, Any]) -> None:
+        backend = self.backend
+        if backend == "shm":
+            backend = SharedMemoryCache(
+                self.cache_name,
+                slots=kwargs.pop("slots", 512),
+                slot_size=kwargs.pop("slot_size", 131072),
+                expire_after=self.expire_after,
+            )
         requests_cache.install_cache(
             self.cache_name,
-            backend=self.backend,
+            backend=backend,
             expire_after=self.expire_after,
             allowable_methods=self.allowable_methods,
             **kwargs
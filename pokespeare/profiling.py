@@ -0,0 +1,73 @@
+"""
+pokespeare.profiling.py
+~~~~~~~~~~~~~~~~~~~~~~~
+
+On-demand per-request profiling. A request is profiled with cProfile when it
+carries the authorized profiling header or when it falls in the 1-in-N
+sampling, the resulting pstats are dumped per endpoint on a local directory
+and can be inspected with `python -m pstats <file>` or tools like snakeviz.
+"""
+
+import os
+import hmac
+import time
+import cProfile
+import itertools
+from typing import Optional
+
+PROFILE_HEADER = "X-Pokespeare-Profile"
+
+
+class RequestProfiler:
+    """Decide which requests to profile and store their stats.
+
+    :type output_dir: str
+    :param output_dir: The directory where to write the stats, each endpoint
+                       get its own sub-directory
+
+    :type token: str
+    :param token: The secret value expected on the profiling header, `None`
+                  to disable profiling by header
+
+    :type sample_every: int
+    :param sample_every: Profile one request every `sample_every`, 0 to
+                         disable sampling
+    """
+
+    def __init__(
+        self,
+        output_dir: str,
+        *,
+        token: Optional[str] = None,
+        sample_every: int = 0
+    ):
+        self.output_dir = output_dir
+        self.token = token
+        self.sample_every = sample_every
+        self._counter = itertools.count(1)
+
+    def should_profile(self, header: Optional[str] = None) -> bool:
+        """Return True if the header carries the right token or the current
+        request is the 1-in-N sampled one"""
+        if self.token and header:
+            if hmac.compare_digest(header.encode(), self.token.encode()):
+                return True
+        if self.sample_every > 0:
+            return next(self._counter) % self.sample_every == 0
+        return False
+
+    def start(self) -> cProfile.Profile:
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile
+
+    def stop(self, profile: cProfile.Profile, endpoint: Optional[str]) -> str:
+        """Stop the profile and dump it, return the path of the stats file"""
+        profile.disable()
+        directory = os.path.join(self.output_dir, endpoint or "unknown")
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(
+            directory, "%d-%d.pstats" % (time.time() * 1000, os.getpid())
+        )
+        profile.dump_stats(path)
+        return path
@@ -0,0 +1,77 @@
+import io
+import json
+import time
+import unittest
+from pokespeare.accesslog import AccessLogger, make_record
+
+
+class TestAccessLogger(unittest.TestCase):
+    def setUp(self):
+        self.stream = io.StringIO()
+
+    def test_access_logger_flush(self):
+        logger = AccessLogger(self.stream, flush_interval=60)
+        record = make_record(
+            "GET", "/pokemon/haunter", 200, time.perf_counter(), []
+        )
+        self.assertTrue(logger.log(record))
+        self.assertEqual(self.stream.getvalue(), "")
+        logger.flush()
+        lines = self.stream.getvalue().splitlines()
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(json.loads(lines[0])["path"], "/pokemon/haunter")
+
+    def test_access_logger_background_flush(self):
+        logger = AccessLogger(self.stream, flush_interval=0.01)
+        logger.log(make_record("GET", "/", 200, time.perf_counter(), []))
+        deadline = time.monotonic() + 5
+        while not self.stream.getvalue() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        logger.close()
+        self.assertEqual(len(self.stream.getvalue().splitlines()), 1)
+
+    def test_access_logger_close(self):
+        logger = AccessLogger(self.stream, flush_interval=60)
+        logger.log(make_record("GET", "/", 200, time.perf_counter(), []))
+        logger.close()
+        self.assertFalse(logger._thread.is_alive())
+        self.assertEqual(len(self.stream.getvalue().splitlines()), 1)
+
+    def test_access_logger_sampling(self):
+        logger = AccessLogger(self.stream, sample_rate=0.0, flush_interval=60)
+        ok = make_record("GET", "/", 200, time.perf_counter(), [])
+        error = make_record("GET", "/", 404, time.perf_counter(), [])
+        slow = make_record("GET", "/", 200, time.perf_counter() - 2, [])
+        self.assertFalse(logger.log(ok))
+        self.assertTrue(logger.log(error))
+        self.assertTrue(logger.log(slow))
+
+    def test_access_logger_buffer_full(self):
+        logger = AccessLogger(self.stream, flush_interval=60, buffer_size=2)
+        for _ in range(3):
+            logger.log(make_record("GET", "/", 200, time.perf_counter(), []))
+        self.assertEqual(logger.dropped, 1)
+        logger.flush()
+        self.assertEqual(len(self.stream.getvalue().splitlines()), 2)
+
+    def test_make_record_outcome(self):
+        hit = [
+            {"service": "pokeapi", "cache": "memory", "status": 200, "ms": 0.1}
+        ]
+        miss = [
+            {"service": "pokeapi", "cache": None, "status": 200, "ms": 10.0}
+        ]
+        started = time.perf_counter()
+        self.assertEqual(
+            make_record("GET", "/", 200, started, hit)["outcome"], "hit"
+        )
+        self.assertEqual(
+            make_record("GET", "/", 200, started, miss)["outcome"], "miss"
+        )
+        self.assertEqual(
+            make_record("GET", "/", 404, started, hit)["outcome"], "error"
+        )
+        self.assertEqual(
+            make_record("GET", "/", 200, started, [], "compact")["outcome"],
+            "hit",
+        )
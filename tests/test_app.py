@@ -1,5 +1,7 @@
+import copy
 import unittest
 from unittest.mock import patch
+from pokespeare import app
 from pokespeare.app import flask_app
 from pokespeare.exceptions import HTTPError
 from pokespeare.config import DevelopmentConfig
@@ -52,7 +54,9 @@ class FakeResponse:
         self.status_code = expected_status_code
 
     def json(self):
-        return self.content
+        # Schemas mutate the loaded payload, mimic requests returning a fresh
+        # object at each call
+        return copy.deepcopy(self.content)
 
     def raise_for_status(self):
         if self.expected_status_code == 403:
@@ -142,3 +146,82 @@ class AppTest(unittest.TestCase):
             result.json,
             {"description": "'t The best one.'", "name": "haunter"},
         )
+
+    @patch(
+        "pokespeare.app.get_http_client", return_value=FakeRequests(200),
+    )
+    @patch("pokespeare.app.get_access_logger")
+    def test_get_pokemon_description_access_log(self, logger_mock, req_mock):
+        with patch.dict(flask_app.config, {"ACCESS_LOG": True}):
+            result = self.app.get("/pokemon/haunter")
+        self.assertEqual(result.status_code, 200)
+        record = logger_mock.return_value.log.call_args[0][0]
+        self.assertEqual(record["status"], 200)
+        self.assertEqual(record["outcome"], "miss")
+        self.assertEqual(
+            [call["service"] for call in record["upstream"]],
+            ["pokeapi", "funtranslations"],
+        )
+
+    @patch(
+        "pokespeare.app.get_http_client", return_value=FakeRequests(200),
+    )
+    @patch("pokespeare.app.get_request_profiler")
+    def test_get_pokemon_description_profiling(self, profiler_mock, req_mock):
+        profiler_mock.return_value.should_profile.return_value = True
+        with patch.dict(flask_app.config, {"PROFILE": True}):
+            result = self.app.get(
+                "/pokemon/haunter", headers={"X-Pokespeare-Profile": "secret"}
+            )
+        self.assertEqual(result.status_code, 200)
+        profiler_mock.return_value.should_profile.assert_called_with("secret")
+        profiler_mock.return_value.stop.assert_called_once_with(
+            profiler_mock.return_value.start.return_value,
+            "get_pokemon_description",
+        )
+
+    @patch("pokespeare.app.get_http_client")
+    def test_get_pokemon_description_compact_cache(self, req_mock):
+        req_mock.return_value = FakeRequests(200)
+        with patch.dict(
+            flask_app.config,
+            {"CACHE_MODE": "compact", "CACHE_BACKEND": "memory"},
+        ), patch("pokespeare.app._description_cache", None):
+            first = self.app.get("/pokemon/haunter")
+            second = self.app.get("/pokemon/haunter")
+        self.assertEqual(first.json, second.json)
+        self.assertEqual(
+            second.json,
+            {"description": "'t The best one.'", "name": "haunter"},
+        )
+        # Only the first request reaches the upstream services
+        self.assertEqual(req_mock.call_count, 1)
+
+    def test_get_description_cache_shm_compact_slots(self):
+        with patch.dict(
+            flask_app.config, {"CACHE_MODE": "compact", "CACHE_BACKEND": "shm"}
+        ), patch("pokespeare.app._description_cache", None):
+            table = app.get_description_cache().store.table
+        self.assertEqual(
+            table.slot_size, DevelopmentConfig.COMPACT_CACHE_SLOT_SIZE
+        )
+        self.assertEqual(table.slots, DevelopmentConfig.COMPACT_CACHE_SLOTS)
+
+    @patch(
+        "pokespeare.app.get_http_client", return_value=FakeRequests(200),
+    )
+    def test_get_pokemon_description_profiling_unwritable_dir(self, req_mock):
+        with patch.dict(
+            flask_app.config,
+            {
+                "PROFILE": True,
+                "PROFILE_TOKEN": "secret",
+                "PROFILE_DIR": "/proc/nope",
+            },
+        ), patch("pokespeare.app._profiler", None), self.assertLogs(
+            flask_app.logger, "ERROR"
+        ):
+            result = self.app.get(
+                "/pokemon/haunter", headers={"X-Pokespeare-Profile": "secret"}
+            )
+        self.assertEqual(result.status_code, 200)
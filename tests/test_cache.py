@@ -0,0 +1,251 @@
+import io
+import os
+import time
+import signal
+import struct
+import tempfile
+import unittest
+import requests
+import requests_cache
+import urllib3
+from unittest.mock import patch
+from pokespeare.http import RequestsHTTPClient
+from pokespeare.cache import (
+    CompactCache,
+    MemoryStore,
+    RedisStore,
+    SharedMemoryCache,
+    SharedMemoryDict,
+    SharedMemoryStore,
+    SharedMemoryTable,
+    SQLiteStore,
+)
+
+
+class TestSharedMemoryTable(unittest.TestCase):
+    def setUp(self):
+        self.table = SharedMemoryTable(slots=16, slot_size=256, ways=4)
+
+    def test_set_get_delete(self):
+        self.assertTrue(self.table.set(b"haunter", b"The best one."))
+        self.assertEqual(self.table.get(b"haunter"), b"The best one.")
+        self.assertTrue(self.table.set(b"haunter", b"Updated."))
+        self.assertEqual(self.table.get(b"haunter"), b"Updated.")
+        self.assertTrue(self.table.delete(b"haunter"))
+        self.assertIsNone(self.table.get(b"haunter"))
+        self.assertFalse(self.table.delete(b"haunter"))
+
+    def test_value_too_big(self):
+        self.assertFalse(self.table.set(b"big", b"x" * 256))
+        self.assertIsNone(self.table.get(b"big"))
+
+    def test_ttl(self):
+        table = SharedMemoryTable(slots=4, slot_size=128, ways=4, ttl=0.05)
+        table.set(b"squirtle", b"Sprinkle water.")
+        self.assertEqual(table.get(b"squirtle"), b"Sprinkle water.")
+        time.sleep(0.1)
+        self.assertIsNone(table.get(b"squirtle"))
+        self.assertEqual(list(table.keys()), [])
+
+    def test_bounded_eviction(self):
+        # Single bucket, the oldest entry is evicted once full
+        table = SharedMemoryTable(slots=4, slot_size=128, ways=4)
+        for i in range(5):
+            table.set(b"key-%d" % i, b"value")
+        self.assertIsNone(table.get(b"key-0"))
+        self.assertEqual(
+            sorted(table.keys()), [b"key-%d" % i for i in range(1, 5)]
+        )
+
+    def test_shared_across_fork(self):
+        pid = os.fork()
+        if pid == 0:
+            # Never let the child return into the test runner
+            code = 1
+            try:
+                self.table.set(b"from-child", b"hello")
+                code = 0
+            finally:
+                os._exit(code)
+        _, status = os.waitpid(pid, 0)
+        self.assertTrue(os.WIFEXITED(status))
+        self.assertEqual(os.WEXITSTATUS(status), 0)
+        self.assertEqual(self.table.get(b"from-child"), b"hello")
+
+    def test_lock_held_by_killed_process(self):
+        table = SharedMemoryTable(slots=4, slot_size=128, ways=4, stripes=1)
+        table.LOCK_TIMEOUT = 0.1
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            # Take the only stripe lock and die without releasing it
+            try:
+                table._locks[0].acquire()
+                os.write(write_fd, b"x")
+                time.sleep(60)
+            finally:
+                os._exit(1)
+        os.read(read_fd, 1)
+        os.kill(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+        os.close(read_fd)
+        os.close(write_fd)
+        started = time.monotonic()
+        self.assertFalse(table.set(b"haunter", b"The best one."))
+        self.assertFalse(table.delete(b"haunter"))
+        table.clear()
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertIsNone(table.get(b"haunter"))
+
+    def test_torn_header_read(self):
+        self.table.set(b"a", b"1")
+        index = next(
+            i for i in range(self.table.slots) if self.table._read(i)
+        )
+        offset = index * self.table.slot_size
+        # Even sequence but lengths past the slot, as seen mid-write
+        _, state, key_hash, stored, expires, _, _ = struct.unpack_from(
+            "<IBxxxQddII", self.table._mem, offset
+        )
+        struct.pack_into(
+            "<IBxxxQddII",
+            self.table._mem,
+            offset,
+            2,
+            state,
+            key_hash,
+            stored,
+            expires,
+            1,
+            self.table.slots * self.table.slot_size,
+        )
+        self.assertIsNone(self.table._read(index))
+        self.assertIsNone(self.table.get(b"a"))
+
+    def test_recover_odd_sequence(self):
+        # A writer killed mid-way leaves the slot sequence odd, the next
+        # write must bring it back to even
+        self.table.set(b"a", b"1")
+        index = next(
+            i for i in range(self.table.slots) if self.table._read(i)
+        )
+        offset = index * self.table.slot_size
+        struct.pack_into("<I", self.table._mem, offset, 3)
+        self.assertTrue(self.table.set(b"a", b"2"))
+        seq = struct.unpack_from("<I", self.table._mem, offset)[0]
+        self.assertEqual(seq % 2, 0)
+        self.assertEqual(self.table.get(b"a"), b"2")
+
+
+def fake_send(adapter, request, **kwargs):
+    """Stand-in for the network, build a fresh JSON response each call"""
+    body = b'{"name": "haunter"}'
+    response = requests.models.Response()
+    response.status_code = 200
+    response.headers["Content-Type"] = "application/json"
+    response._content = body
+    response.raw = urllib3.HTTPResponse(
+        body=io.BytesIO(body), preload_content=False
+    )
+    response.url = request.url
+    response.request = request
+    return response
+
+
+class TestSharedMemoryCache(unittest.TestCase):
+    @patch(
+        "requests.adapters.HTTPAdapter.send",
+        side_effect=fake_send,
+        autospec=True,
+    )
+    def test_requests_http_client_shm_backend(self, send_mock):
+        client = RequestsHTTPClient(
+            "pokespeare_test",
+            backend="shm",
+            expire_after=60,
+            slots=16,
+            slot_size=65536,
+        )
+        self.addCleanup(requests_cache.uninstall_cache)
+        self.assertIsInstance(requests.Session().cache, SharedMemoryCache)
+        url = "http://pokeapi.test/api/v2/pokemon-species/haunter"
+        first = client.get(url)
+        second = client.get(url)
+        self.assertFalse(getattr(first, "from_cache", False))
+        self.assertTrue(second.from_cache)
+        self.assertEqual(second.json(), {"name": "haunter"})
+        self.assertEqual(send_mock.call_count, 1)
+
+
+class TestSharedMemoryDict(unittest.TestCase):
+    def test_namespaces(self):
+        table = SharedMemoryTable(slots=16, slot_size=256, ways=4)
+        responses = SharedMemoryDict(table, "responses")
+        redirects = SharedMemoryDict(table, "redirects")
+        responses["abc"] = {"name": "haunter"}
+        redirects["def"] = "abc"
+        self.assertEqual(responses["abc"], {"name": "haunter"})
+        self.assertEqual(list(responses), ["abc"])
+        self.assertEqual(len(redirects), 1)
+        with self.assertRaises(KeyError):
+            _ = responses["def"]
+        responses.clear()
+        self.assertEqual(len(responses), 0)
+        self.assertEqual(len(redirects), 1)
+
+
+class TestCompactCache(unittest.TestCase):
+    def test_set_get(self):
+        for compress in (False, True):
+            cache = CompactCache(MemoryStore(), compress=compress)
+            cache.set(
+                "haunter", "haunter", "The best one.", "'t The best one.'"
+            )
+            entry = cache.get("haunter")
+            self.assertEqual(entry["name"], "haunter")
+            self.assertEqual(entry["text"], "The best one.")
+            self.assertEqual(entry["translated"], "'t The best one.'")
+            self.assertIsNone(cache.get("squirtle"))
+
+    def test_encoding(self):
+        cache = CompactCache(MemoryStore())
+        value = cache.encode("haunter", "The best one.", "'t The best one.'")
+        self.assertTrue(value.startswith(CompactCache.JSON))
+        cache.compress = True
+        value = cache.encode("haunter", "The best one.", "'t The best one.'")
+        self.assertTrue(value.startswith(CompactCache.ZLIB))
+        self.assertEqual(CompactCache.decode(value)["name"], "haunter")
+
+    def test_expiration(self):
+        store = MemoryStore()
+        cache = CompactCache(store, expire_after=60)
+        store.set("haunter", b'j["haunter","a","b",0]')
+        self.assertIsNone(cache.get("haunter"))
+
+    def test_stores(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            stores = [
+                SharedMemoryStore(SharedMemoryTable(slots=8, slot_size=256)),
+                SQLiteStore(os.path.join(tmp, "cache.sqlite")),
+            ]
+            for store in stores:
+                cache = CompactCache(store)
+                cache.set(
+                    "haunter", "haunter", "The best one.", "'t The best.'"
+                )
+                self.assertEqual(
+                    cache.get("haunter")["translated"], "'t The best.'"
+                )
+
+    def test_redis_store_prefix(self):
+        class FakeRedis(dict):
+            def set(self, key, value, ex=None):
+                self[key] = value
+
+        connection = FakeRedis()
+        cache = CompactCache(RedisStore("pokespeare_cache", connection))
+        cache.set("responses", "responses", "The best one.", "'t The best.'")
+        self.assertEqual(
+            list(connection), ["pokespeare_cache:compact:responses"]
+        )
+        self.assertEqual(cache.get("responses")["name"], "responses")
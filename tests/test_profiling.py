@@ -0,0 +1,36 @@
+import os
+import pstats
+import tempfile
+import unittest
+from pokespeare.profiling import RequestProfiler
+
+
+class TestRequestProfiler(unittest.TestCase):
+    def test_should_profile_disabled(self):
+        profiler = RequestProfiler("profiles")
+        self.assertFalse(profiler.should_profile("secret"))
+
+    def test_should_profile_token(self):
+        profiler = RequestProfiler("profiles", token="secret")
+        self.assertTrue(profiler.should_profile("secret"))
+        self.assertFalse(profiler.should_profile("wrong"))
+        self.assertFalse(profiler.should_profile(None))
+
+    def test_should_profile_sampling(self):
+        profiler = RequestProfiler("profiles", sample_every=3)
+        self.assertEqual(
+            [profiler.should_profile() for _ in range(6)],
+            [False, False, True, False, False, True],
+        )
+
+    def test_stop_dumps_stats(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            profiler = RequestProfiler(output_dir)
+            profile = profiler.start()
+            sorted(range(1000))
+            path = profiler.stop(profile, "get_pokemon_description")
+            self.assertEqual(
+                os.path.dirname(path),
+                os.path.join(output_dir, "get_pokemon_description"),
+            )
+            self.assertTrue(pstats.Stats(path).total_calls > 0)